@@ -1,7 +1,12 @@
 """RealSense キャプチャモジュール（ADR 003, 008）"""
 
+import json
 import logging
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
 import cv2
@@ -12,6 +17,14 @@ from finger_tracker.config import load_config
 
 logger = logging.getLogger(__name__)
 
+_JST = timezone(timedelta(hours=9))
+
+# 深度の保存形式 → 拡張子
+_DEPTH_SUFFIX = {"npy": ".npy", "npz": ".npz", "png16": ".png"}
+
+# 再開時に読むマニフェスト末尾のバイト数（1 行 ~500B、未完了の書き込み数より十分大きい）
+_MANIFEST_TAIL_BYTES = 64 * 1024
+
 
 def _find_next_index(output_dir: Path, prefix: str) -> int:
     """既存ファイルの最大連番 + 1 を返す。"""
@@ -25,6 +38,186 @@ def _find_next_index(output_dir: Path, prefix: str) -> int:
     return max_idx + 1 if max_idx > 0 else 1
 
 
+# ---------------------------------------------------------------------------
+# マニフェスト（フレームごとの記録）
+# ---------------------------------------------------------------------------
+
+def _read_manifest_tail(manifest_path: Path) -> list[dict]:
+    """マニフェスト末尾の完結した行だけを読み込んで返す。"""
+    with open(manifest_path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - _MANIFEST_TAIL_BYTES))
+        tail = f.read()
+    lines = tail.split(b"\n")
+    if size > _MANIFEST_TAIL_BYTES:
+        lines = lines[1:]  # 先頭行は途中から読んでいる可能性がある
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # 書き込み途中で終了した行
+    return records
+
+
+def _resume_index(output_dir: Path, prefix: str, manifest_path: Path) -> int:
+    """次に使う連番を返す。マニフェストがあれば末尾のみ読む（O(1)）。"""
+    if not manifest_path.exists():
+        return _find_next_index(output_dir, prefix)
+
+    records = _read_manifest_tail(manifest_path)
+    if not records:
+        return _find_next_index(output_dir, prefix)
+
+    # 書き込みスレッドの完了順で行が前後するため末尾数行の最大値を取る
+    idx = max(r["index"] for r in records) + 1
+    # マニフェスト記録前に終了したフレームのファイルを上書きしない
+    while (output_dir / f"{prefix}_{idx:03d}_rgb.png").exists():
+        idx += 1
+    return idx
+
+
+def read_manifest(output_dir: Path, manifest_name: str = "manifest.jsonl") -> list[dict]:
+    """キャプチャディレクトリのマニフェストを全件読み込み、連番順で返す。
+
+    Args:
+        output_dir: キャプチャの保存先ディレクトリ。
+        manifest_name: マニフェストのファイル名。
+
+    Returns:
+        フレームごとの記録 dict のリスト。
+    """
+    manifest_path = Path(output_dir) / manifest_name
+    if not manifest_path.exists():
+        raise FileNotFoundError(
+            f"ERROR: マニフェストが見つかりません: {manifest_path}\n"
+            "  capture モジュールで撮影したディレクトリを指定してください。"
+        )
+
+    records = []
+    with open(manifest_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("マニフェストの壊れた行をスキップ: %s", manifest_path)
+    return sorted(records, key=lambda r: r["index"])
+
+
+def load_depth(path: Path) -> np.ndarray:
+    """保存形式（.npy / .npz / 16bit PNG）に応じて深度配列（z16）を読み込む。"""
+    path = Path(path)
+    if path.suffix == ".npz":
+        with np.load(path) as data:
+            return data["depth"]
+    if path.suffix == ".png":
+        return cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    return np.load(path)
+
+
+def _intrinsics_dict(intrinsics) -> dict:
+    """rs.intrinsics を JSON 化できる dict に変換する。"""
+    return {
+        "width": intrinsics.width,
+        "height": intrinsics.height,
+        "ppx": intrinsics.ppx,
+        "ppy": intrinsics.ppy,
+        "fx": intrinsics.fx,
+        "fy": intrinsics.fy,
+        "model": str(intrinsics.model),
+        "coeffs": list(intrinsics.coeffs),
+    }
+
+
+# ---------------------------------------------------------------------------
+# バックグラウンド書き込み
+# ---------------------------------------------------------------------------
+
+class _FrameWriter:
+    """PNG / 深度の書き込みをスレッドプールで行い、完了後にマニフェストへ追記する。
+
+    プレビューループを止めないよう、未完了の書き込みが max_pending に
+    達している間は submit() が False を返してフレームを捨てる。
+    """
+
+    def __init__(self, output_dir: Path, manifest_path: Path,
+                 depth_format: str, threads: int, max_pending: int):
+        if depth_format not in _DEPTH_SUFFIX:
+            raise ValueError(
+                f"ERROR: capture.depth_format が不正です: {depth_format}\n"
+                f"  {', '.join(_DEPTH_SUFFIX)} のいずれかを指定してください。"
+            )
+        self.output_dir = output_dir
+        self.depth_format = depth_format
+        self.max_pending = max_pending
+        self.written = 0
+        self.failed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._manifest = open(manifest_path, "a")
+        self._executor = ThreadPoolExecutor(max_workers=threads,
+                                            thread_name_prefix="capture-writer")
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, tag: str, color_image: np.ndarray, depth_array: np.ndarray,
+               record: dict) -> bool:
+        """書き込みを予約する。キューが埋まっていれば False を返す。"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+        self._executor.submit(self._write, tag, color_image, depth_array, record)
+        return True
+
+    def _write(self, tag: str, color_image: np.ndarray, depth_array: np.ndarray,
+               record: dict):
+        rgb_name = f"{tag}_rgb.png"
+        depth_name = f"{tag}_depth{_DEPTH_SUFFIX[self.depth_format]}"
+        try:
+            # cv2.imwrite は容量不足・権限エラーでも例外を出さず False を返す
+            if not cv2.imwrite(str(self.output_dir / rgb_name), color_image):
+                raise OSError(f"cv2.imwrite 失敗: {rgb_name}")
+            depth_path = self.output_dir / depth_name
+            if self.depth_format == "npz":
+                np.savez_compressed(depth_path, depth=depth_array)
+            elif self.depth_format == "png16":
+                if not cv2.imwrite(str(depth_path), depth_array.astype(np.uint16)):
+                    raise OSError(f"cv2.imwrite 失敗: {depth_name}")
+            else:
+                np.save(depth_path, depth_array)
+
+            record = {**record, "rgb": rgb_name, "depth": depth_name}
+            line = json.dumps(record, ensure_ascii=False)
+            with self._lock:
+                self._manifest.write(line + "\n")
+                self._manifest.flush()
+                self.written += 1
+        except Exception as e:
+            logger.error("保存失敗 %s: %s", tag, e)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def close(self):
+        """未完了の書き込みを待ってからマニフェストを閉じる。"""
+        self._executor.shutdown(wait=True)
+        self._manifest.close()
+
+
+# ---------------------------------------------------------------------------
+# メインループ
+# ---------------------------------------------------------------------------
+
 def run():
     """キャプチャのメインループ。"""
     config = load_config()
@@ -34,8 +227,13 @@ def run():
     output_dir = Path(cap["output_dir"])
     output_dir.mkdir(parents=True, exist_ok=True)
     prefix = cap["prefix"]
-    idx = _find_next_index(output_dir, prefix)
-    saved = 0
+    manifest_path = output_dir / cap["manifest"]
+    idx = _resume_index(output_dir, prefix, manifest_path)
+    burst_interval = 1.0 / cap["burst_hz"]
+
+    writer = _FrameWriter(output_dir, manifest_path, cap["depth_format"],
+                          cap["writer_threads"], cap["max_pending"])
+    dropped = 0
 
     # RealSense 初期化
     pipeline = rs.pipeline()
@@ -44,18 +242,25 @@ def run():
     rs_config.enable_stream(rs.stream.depth, cam["width"], cam["height"], rs.format.z16, cam["fps"])
 
     try:
-        pipeline.start(rs_config)
+        profile = pipeline.start(rs_config)
     except RuntimeError as e:
         logger.error("RealSense D435i が見つかりません: %s", e)
         print(f"ERROR: RealSense D435i が見つかりません: {e}")
         print("  USB 接続を確認してください。rs-enumerate-devices で確認できます。")
+        writer.close()
         return
 
     align = rs.align(rs.stream.color)
+    intrinsics = _intrinsics_dict(
+        profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics())
+    depth_scale = profile.get_device().first_depth_sensor().get_depth_scale()
+
+    burst = False
+    last_burst_time = 0.0
 
     try:
-        print(f"キャプチャ開始 — 保存先: {output_dir}/")
-        print("  s: 保存  q/ESC: 終了")
+        print(f"キャプチャ開始 — 保存先: {output_dir}/（連番 {idx:03d} から）")
+        print(f"  s: 保存  b: 連続保存 ({cap['burst_hz']}Hz) 切替  q/ESC: 終了")
 
         while True:
             frames = pipeline.wait_for_frames()
@@ -69,26 +274,56 @@ def run():
             color_image = np.asanyarray(color_frame.get_data())
             depth_array = np.asanyarray(depth_frame.get_data())
 
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord("q") or key == 27:
+                break
+            if key == ord("b"):
+                burst = not burst
+                print(f"  連続保存: {'ON' if burst else 'OFF'}")
+
+            now = time.monotonic()
+            save = key == ord("s")
+            if burst and now - last_burst_time >= burst_interval:
+                save = True
+                last_burst_time = now
+
+            if save:
+                tag = f"{prefix}_{idx:03d}"
+                record = {
+                    "index": idx,
+                    "tag": tag,
+                    "timestamp": datetime.now(_JST).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3],
+                    "monotonic": now,
+                    "frame_timestamp_ms": color_frame.get_timestamp(),
+                    "depth_scale": depth_scale,
+                    "intrinsics": intrinsics,
+                }
+                # フレームバッファは SDK に再利用されるため、書き込みスレッドへはコピーを渡す
+                if writer.submit(tag, color_image.copy(), depth_array.copy(), record):
+                    idx += 1
+                    if not burst:
+                        print(f"  保存: {tag}")
+                else:
+                    dropped += 1
+                    logger.warning("書き込み待ちが上限 (%d) — フレームを破棄", writer.max_pending)
+
             # プレビュー表示
             display = color_image.copy()
-            cv2.putText(display, f"Saved: {saved}", (10, 30),
+            status = f"Saved: {writer.written}  Queue: {writer.pending}"
+            if burst:
+                status += f"  BURST {cap['burst_hz']}Hz"
+            cv2.putText(display, status, (10, 30),
                         cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             cv2.imshow("Capture", display)
 
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord("s"):
-                tag = f"{prefix}_{idx:03d}"
-                cv2.imwrite(str(output_dir / f"{tag}_rgb.png"), color_image)
-                np.save(str(output_dir / f"{tag}_depth.npy"), depth_array)
-                print(f"  保存: {tag}")
-                idx += 1
-                saved += 1
-            elif key == ord("q") or key == 27:
-                break
-
     except KeyboardInterrupt:
         logger.info("ユーザーによる終了 (Ctrl+C)")
     finally:
         pipeline.stop()
         cv2.destroyAllWindows()
-        print(f"終了 — 合計 {saved} 枚保存")
+        if writer.pending:
+            print(f"書き込み待ち {writer.pending} 枚を保存中...")
+        writer.close()
+        print(f"終了 — 合計 {writer.written} 枚保存"
+              + (f"（失敗 {writer.failed} 枚）" if writer.failed else "")
+              + (f"（破棄 {dropped} 枚）" if dropped else ""))
@@ -1,9 +1,13 @@
 """設定管理モジュール（ADR 006）"""
 
+import logging
+import threading
 from pathlib import Path
 
 import yaml
 
+logger = logging.getLogger(__name__)
+
 _DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[3] / "config.yaml"
 
 _DEFAULTS = {
@@ -20,7 +24,39 @@ _DEFAULTS = {
     },
     "filter": {"kalman_q": 0.01, "kalman_r": 0.1, "depth_timeout": 0.5},
     "display": {"fps_target": 30},
-    "capture": {"output_dir": "data/images", "prefix": "frame"},
+    "reload": {"enabled": True, "interval": 1.0},
+    "metrics": {"enabled": False, "host": "127.0.0.1", "port": 9108},
+    "capture": {
+        "output_dir": "data/images",
+        "prefix": "frame",
+        "depth_format": "npy",
+        "burst_hz": 5,
+        "writer_threads": 2,
+        "max_pending": 32,
+        "manifest": "manifest.jsonl",
+    },
+    "labeling": {
+        "input_dir": "data/images",
+        "output_dir": "data/datasets/auto-v1",
+        "use_model": True,
+        "model_confidence": 0.25,
+        "workers": 0,
+        "min_area": 80,
+        "review_threshold": 0.6,
+        "val_ratio": 0.2,
+    },
+    "replay": {"cache_dir": "data/cache/detections", "use_cache": True},
+    "sweep": {
+        "session_dir": "data/sessions/sweep",
+        "mode": "grid",
+        "trials": 50,
+        "seed": 0,
+        "workers": 0,
+        "output_dir": "runs/sweep",
+        "weights": {"jitter": 1.0, "dropout": 100.0, "latency": 0.05},
+        # _deep_merge でユーザー指定とマージされないよう空にしておく（例は config.yaml）
+        "params": {},
+    },
     "training": {
         "dataset": "data/datasets/finger-cots-v1/data.yaml",
         "epochs": 100,
@@ -28,6 +64,21 @@ _DEFAULTS = {
         "batch": 16,
         "imgsz": 640,
         "base_model": "yolov8n.pt",
+        "workers": 8,
+        "cache": False,
+        "rect": False,
+        "threads": 0,
+        "benchmark": {
+            "epochs": 1,
+            "fraction": 0.25,
+            "candidates": [
+                {"cache": False, "workers": 4},
+                {"cache": "ram", "workers": 4},
+                {"cache": "disk", "workers": 4},
+                {"cache": "ram", "workers": 0},
+                {"cache": "ram", "workers": 4, "rect": True},
+            ],
+        },
     },
 }
 
@@ -69,3 +120,140 @@ def load_config(path: Path | None = None) -> dict:
         ) from e
 
     return _deep_merge(_DEFAULTS, user_config)
+
+
+# ---------------------------------------------------------------------------
+# 検証（ホットリロード時に不正な値で計測を止めないため）
+# ---------------------------------------------------------------------------
+
+def _check(cond: bool, message: str):
+    if not cond:
+        raise ValueError(f"ERROR: config.yaml の値が不正です: {message}")
+
+
+def _check_hsv_triplet(name: str, value, h_max: int):
+    _check(isinstance(value, list) and len(value) == 3
+           and all(isinstance(v, int) for v in value),
+           f"{name} は整数 3 つのリストで指定してください: {value}")
+    _check(0 <= value[0] <= h_max and all(0 <= v <= 255 for v in value[1:]),
+           f"{name} が範囲外です（H: 0-{h_max}, S/V: 0-255）: {value}")
+
+
+def validate_config(config: dict):
+    """detection が参照する設定値の型と範囲を検証する。不正なら ValueError。"""
+    # 編集途中の YAML（`filter:` だけの行など）はセクションが None や数値になる
+    for section in ("camera", "model", "hsv", "filter", "reload", "metrics"):
+        _check(isinstance(config.get(section), dict),
+               f"{section} セクションは key: value の形式で指定してください: {config.get(section)}")
+    _check(isinstance(config.get("udp", {}), dict),
+           f"udp セクションは key: value の形式で指定してください: {config.get('udp')}")
+
+    cam = config["camera"]
+    for key in ("width", "height", "fps"):
+        _check(isinstance(cam[key], int) and cam[key] > 0,
+               f"camera.{key} は正の整数で指定してください: {cam[key]}")
+
+    model = config["model"]
+    _check(isinstance(model["path"], str) and model["path"] != "",
+           f"model.path が空です: {model['path']}")
+    _check(isinstance(model["confidence"], (int, float)) and 0 < model["confidence"] <= 1,
+           f"model.confidence は 0 より大きく 1 以下で指定してください: {model['confidence']}")
+
+    for color in ("red", "blue"):
+        _check(color in config["hsv"], f"hsv.{color} がありません")
+        params = config["hsv"][color]
+        _check(isinstance(params, dict),
+               f"hsv.{color} は lower / upper を持つ形式で指定してください: {params}")
+        for key in ("lower", "upper", "lower2", "upper2"):
+            if key in params:
+                _check_hsv_triplet(f"hsv.{color}.{key}", params[key], 180)
+        _check(("lower2" in params) == ("upper2" in params),
+               f"hsv.{color} の lower2 / upper2 は両方指定してください")
+
+    flt = config["filter"]
+    for key in ("kalman_q", "kalman_r", "depth_timeout"):
+        _check(isinstance(flt[key], (int, float)) and flt[key] > 0,
+               f"filter.{key} は正の数で指定してください: {flt[key]}")
+
+    interval = config["reload"]["interval"]
+    _check(isinstance(interval, (int, float)) and interval > 0,
+           f"reload.interval は正の数で指定してください: {interval}")
+
+    port = config["metrics"]["port"]
+    _check(isinstance(port, int) and 0 < port < 65536,
+           f"metrics.port は 1-65535 で指定してください: {port}")
+
+    udp = config.get("udp", {})
+    if "port" in udp:
+        _check(isinstance(udp["port"], int) and 0 < udp["port"] < 65536,
+               f"udp.port は 1-65535 で指定してください: {udp['port']}")
+
+
+def changed_sections(old: dict, new: dict) -> set[str]:
+    """値が変わったトップレベルのセクション名を返す。"""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+# ---------------------------------------------------------------------------
+# ホットリロード
+# ---------------------------------------------------------------------------
+
+class ConfigWatcher:
+    """config.yaml の更新をバックグラウンドスレッドで監視する。
+
+    mtime とサイズをポーリングし、変更があれば読み込み・検証した設定を保持する。
+    計測ループはフレームの合間に poll() で受け取り、まとめて反映する。
+    検証に失敗した変更はログに出して破棄し、現在の設定で計測を続ける。
+
+    Args:
+        path: 監視する設定ファイル。None の場合はプロジェクトルートの config.yaml。
+        interval: ポーリング間隔 [秒]。
+    """
+
+    def __init__(self, path: Path | None = None, interval: float = 1.0):
+        self.path = path or _DEFAULT_CONFIG_PATH
+        self.interval = interval
+        self._stamp = self._stat()
+        self._pending: dict | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="config-watcher",
+                                        daemon=True)
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            stamp = self._stat()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+            try:
+                config = load_config(self.path)
+                validate_config(config)
+            except Exception as e:
+                # 編集途中の不正な内容で監視スレッドを止めない
+                logger.warning("設定の再読み込みを中止（現在の設定で継続）: %s", e)
+                continue
+            with self._lock:
+                self._pending = config
+            logger.info("config.yaml の変更を検出: %s", self.path)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def poll(self) -> dict | None:
+        """検証済みの新しい設定があれば返す（1 度だけ）。なければ None。"""
+        with self._lock:
+            config, self._pending = self._pending, None
+        return config
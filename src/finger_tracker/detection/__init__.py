@@ -11,9 +11,9 @@ from pathlib import Path
 import cv2
 import numpy as np
 import pyrealsense2 as rs
-from ultralytics import YOLO
 
-from finger_tracker.config import load_config
+from finger_tracker.config import ConfigWatcher, changed_sections, load_config, validate_config
+from finger_tracker.metrics import MetricsRegistry, start_server
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +52,20 @@ class KalmanFilter3D:
         # 観測ノイズ R
         self.R = np.eye(3) * r
         self._initialized = False
+        # 直近の更新でのイノベーション（観測 - 予測）の大きさ [m]
+        self.innovation = 0.0
+
+    def set_noise(self, q: float, r: float):
+        """状態を保ったままプロセスノイズ Q と観測ノイズ R を差し替える。"""
+        self.Q = np.eye(6) * q
+        self.R = np.eye(3) * r
+
+    def set_dt(self, dt: float):
+        """状態を保ったまま遷移行列 F の時間刻みを差し替える。"""
+        self.dt = dt
+        self.F[0, 3] = dt
+        self.F[1, 4] = dt
+        self.F[2, 5] = dt
 
     def predict(self):
         """予測ステップ。"""
@@ -69,6 +83,7 @@ class KalmanFilter3D:
             self._initialized = True
             return
         y = measurement - self.H @ self.x
+        self.innovation = float(np.linalg.norm(y))
         S = self.H @ self.P @ self.H.T + self.R
         K = self.P @ self.H.T @ np.linalg.inv(S)
         self.x = self.x + K @ y
@@ -105,16 +120,25 @@ def _mask_centroid(mask: np.ndarray):
 # 深度フォールバック（ADR 002 判断3）
 # ---------------------------------------------------------------------------
 
+# _get_depth が採用した段階（メトリクスのラベル）。no_mask は HSV マスクが空で深度取得前に終了
+_DEPTH_SOURCES = ("mask_median", "centroid", "bbox_median", "hold", "none", "no_mask")
+
 def _get_depth(depth_frame, mask: np.ndarray, cx: int, cy: int,
                x1: int, y1: int, x2: int, y2: int,
                last_depth: float, last_depth_time: float,
-               depth_timeout: float) -> tuple[float, float]:
+               depth_timeout: float, now: float | None = None) -> tuple[float, float, str]:
     """深度値をフォールバックチェーンで取得する。
 
+    Args:
+        now: 現在時刻（monotonic 秒）。None なら time.monotonic()。記録済みセッションの
+            再生時はフレームの撮影時刻を渡す。
+
     Returns:
-        (depth_value, last_depth_time) — depth_value=0 なら計測不能。
+        (depth_value, last_depth_time, source) — depth_value=0 なら計測不能。
+            source は採用したフォールバック段階（_DEPTH_SOURCES のいずれか）。
     """
-    now = time.monotonic()
+    if now is None:
+        now = time.monotonic()
 
     # 1. マスク内有効ピクセルの中央値（ノイズ耐性を優先）
     ys, xs = np.where(mask > 0)
@@ -123,12 +147,12 @@ def _get_depth(depth_frame, mask: np.ndarray, cx: int, cy: int,
                          for my, mx in zip(ys, xs)])
         valid = vals[vals > 0]
         if len(valid) > 0:
-            return float(np.median(valid)), now
+            return float(np.median(valid)), now, "mask_median"
 
     # 2. マスク重心の深度（マスク内で有効値がない場合のフォールバック）
     d = depth_frame.get_distance(cx, cy)
     if d > 0:
-        return d, now
+        return d, now, "centroid"
 
     # 3. BB 内全体で有効ピクセル探索
     bb_depths = []
@@ -138,13 +162,13 @@ def _get_depth(depth_frame, mask: np.ndarray, cx: int, cy: int,
             if val > 0:
                 bb_depths.append(val)
     if bb_depths:
-        return float(np.median(bb_depths)), now
+        return float(np.median(bb_depths)), now, "bbox_median"
 
     # 4. 直前値保持（タイムアウト付き）
     if last_depth > 0 and (now - last_depth_time) < depth_timeout:
-        return last_depth, last_depth_time
+        return last_depth, last_depth_time, "hold"
 
-    return 0.0, now
+    return 0.0, now, "none"
 
 
 # ---------------------------------------------------------------------------
@@ -154,7 +178,8 @@ def _get_depth(depth_frame, mask: np.ndarray, cx: int, cy: int,
 def _process_detection(box, class_name: str, color_image: np.ndarray,
                        depth_frame, intrinsics,
                        hsv_config: dict, depth_timeout: float,
-                       last_depths: dict, last_depth_times: dict):
+                       last_depths: dict, last_depth_times: dict,
+                       depth_sources: dict | None = None):
     """1つの検出結果から 3D 座標を取得する。
 
     Returns:
@@ -172,14 +197,38 @@ def _process_detection(box, class_name: str, color_image: np.ndarray,
     if x2 <= x1 or y2 <= y1:
         return None, conf, None
 
+    point_3d, pixel = _measure_roi(color_image[y1:y2, x1:x2], x1, y1, x2, y2,
+                                   class_name, depth_frame, intrinsics,
+                                   hsv_config, depth_timeout,
+                                   last_depths, last_depth_times,
+                                   depth_sources=depth_sources)
+    return point_3d, conf, pixel
+
+
+def _measure_roi(roi: np.ndarray, x1: int, y1: int, x2: int, y2: int,
+                 class_name: str, depth_frame, intrinsics,
+                 hsv_config: dict, depth_timeout: float,
+                 last_depths: dict, last_depth_times: dict,
+                 now: float | None = None, depth_sources: dict | None = None):
+    """クリップ済み BB の ROI から HSV マスク重心の 3D 座標を求める。
+
+    深度はこの BB 内でのみ参照するため、depth_frame は BB を覆っていれば
+    フレーム全体でなくてもよい（replay では ROI の切り出しを渡す）。
+    depth_sources を渡すと、クラス名 → 採用した深度の取得段階を記録する。
+
+    Returns:
+        (point_3d, pixel) — point_3d は [x,y,z] (meters) or None。
+            pixel は (cx, cy) マスク重心ピクセル座標 or None。
+    """
     # HSV フィルタ → マスク重心
-    roi = color_image[y1:y2, x1:x2]
     hsv_key = "red" if class_name == "red_finger" else "blue"
     mask = _hsv_mask(roi, hsv_config[hsv_key])
     centroid = _mask_centroid(mask)
 
     if centroid is None:
-        return None, conf, None
+        if depth_sources is not None:
+            depth_sources[class_name] = "no_mask"
+        return None, None
 
     cx_local, cy_local = centroid
     cx, cy = x1 + cx_local, y1 + cy_local
@@ -187,18 +236,40 @@ def _process_detection(box, class_name: str, color_image: np.ndarray,
     # 深度取得（フォールバック付き）
     last_d = last_depths.get(class_name, 0.0)
     last_t = last_depth_times.get(class_name, 0.0)
-    depth, dep_time = _get_depth(depth_frame, mask, cx, cy,
-                                  x1, y1, x2, y2,
-                                  last_d, last_t, depth_timeout)
+    depth, dep_time, source = _get_depth(depth_frame, mask, cx, cy,
+                                          x1, y1, x2, y2,
+                                          last_d, last_t, depth_timeout, now)
     last_depths[class_name] = depth
     last_depth_times[class_name] = dep_time
+    if depth_sources is not None:
+        depth_sources[class_name] = source
 
     if depth <= 0:
-        return None, conf, (cx, cy)
+        return None, (cx, cy)
 
     # 3D 座標変換
     point_3d = rs.rs2_deproject_pixel_to_point(intrinsics, [cx, cy], depth)
-    return np.array(point_3d), conf, (cx, cy)
+    return np.array(point_3d), (cx, cy)
+
+
+def _track_step(kf_map: dict, measurements: dict) -> dict:
+    """全フィルタに predict() を実行し、観測のあるクラスのみ update() する（ADR 002）。
+
+    Args:
+        kf_map: クラス名 → KalmanFilter3D。
+        measurements: クラス名 → 3D 観測値 [x,y,z]。未検出・深度取得不能のクラスは含めないか None。
+
+    Returns:
+        クラス名 → フィルタ済み位置 [x,y,z] or None（フィルタ未初期化）。
+    """
+    positions = {}
+    for cls_name, kf in kf_map.items():
+        kf.predict()
+        point_3d = measurements.get(cls_name)
+        if point_3d is not None:
+            kf.update(point_3d)
+        positions[cls_name] = kf.get_position() if kf._initialized else None
+    return positions
 
 
 # ---------------------------------------------------------------------------
@@ -307,8 +378,8 @@ _UDP_INVALID = struct.pack(_UDP_FORMAT, -1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
 def _send_udp(sock: socket.socket, dest: tuple,
               distance_mm: float | None,
               red_pos: np.ndarray | None,
-              blue_pos: np.ndarray | None):
-    """計測データを UDP パケットとして送信する。"""
+              blue_pos: np.ndarray | None) -> bool:
+    """計測データを UDP パケットとして送信する。送信できれば True。"""
     if distance_mm is not None and red_pos is not None and blue_pos is not None:
         packet = struct.pack(_UDP_FORMAT, distance_mm, *red_pos, *blue_pos)
     else:
@@ -317,6 +388,8 @@ def _send_udp(sock: socket.socket, dest: tuple,
         sock.sendto(packet, dest)
     except OSError as e:
         logger.debug("UDP 送信エラー: %s", e)
+        return False
+    return True
 
 
 # ---------------------------------------------------------------------------
@@ -344,6 +417,40 @@ def _setup_logging(session_time: str):
     root_logger.addHandler(ch)
 
 
+# ---------------------------------------------------------------------------
+# メトリクス（ADR 007）
+# ---------------------------------------------------------------------------
+
+class _DetectionMetrics:
+    """計測ループのメトリクス。ループ内ではラベル付きの時系列を事前に取得して使う。"""
+
+    def __init__(self, classes: tuple[str, ...]):
+        r = MetricsRegistry()
+        self.registry = r
+        self.frames = r.counter("finger_tracker_frames_total", "処理したフレーム数")
+        drops = r.counter("finger_tracker_frame_drops_total",
+                          "処理できなかったフレーム数", ("reason",))
+        self.drop_timeout = drops.labels("timeout")
+        self.drop_incomplete = drops.labels("incomplete")
+        detections = r.counter("finger_tracker_detections_total",
+                               "YOLO で検出されたフレーム数（クラス別）", ("class",))
+        self.detections = {c: detections.labels(c) for c in classes}
+        depth = r.counter("finger_tracker_depth_source_total",
+                          "深度フォールバックの採用段階（ADR 002 判断3）", ("class", "source"))
+        self.depth_source = {(c, src): depth.labels(c, src)
+                             for c in classes for src in _DEPTH_SOURCES}
+        innovation = r.gauge("finger_tracker_kalman_innovation_meters",
+                             "直近のカルマンフィルタ更新のイノベーションの大きさ", ("class",))
+        self.innovation = {c: innovation.labels(c) for c in classes}
+        self.udp_packets = r.counter("finger_tracker_udp_packets_total", "UDP 送信パケット数")
+        self.udp_errors = r.counter("finger_tracker_udp_errors_total", "UDP 送信エラー数")
+        self.loop_latency = r.summary("finger_tracker_loop_latency_seconds",
+                                      "フレーム取得から送信までの処理時間")
+        self.fps = r.gauge("finger_tracker_fps", "直近のフレームレート")
+        self.config_reloads = r.counter("finger_tracker_config_reloads_total",
+                                        "反映した設定変更の回数")
+
+
 # ---------------------------------------------------------------------------
 # メインループ
 # ---------------------------------------------------------------------------
@@ -352,8 +459,38 @@ _MAX_RETRY = 3
 _RETRY_INTERVAL = 1.0
 
 
+def _start_camera(cam: dict):
+    """RealSense を起動し、(pipeline, align, intrinsics) を返す。失敗時は RuntimeError。"""
+    pipeline = rs.pipeline()
+    rs_config = rs.config()
+    rs_config.enable_stream(rs.stream.color, cam["width"], cam["height"], rs.format.bgr8, cam["fps"])
+    rs_config.enable_stream(rs.stream.depth, cam["width"], cam["height"], rs.format.z16, cam["fps"])
+    profile = pipeline.start(rs_config)
+    align = rs.align(rs.stream.color)
+    intrinsics = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+    return pipeline, align, intrinsics
+
+
+def _open_udp(udp_cfg: dict) -> tuple:
+    """UDP ソケットを開き、(socket, dest) を返す。無効・失敗時は (None, None)。"""
+    if not udp_cfg.get("enabled", True):
+        return None, None
+    try:
+        udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    except OSError as e:
+        logger.warning("UDP ソケット作成失敗（送信無効）: %s", e)
+        return None, None
+    udp_dest = (udp_cfg.get("host", "127.0.0.1"), udp_cfg.get("port", 50000))
+    logger.info("UDP 送信有効: %s:%d", udp_dest[0], udp_dest[1])
+    return udp_sock, udp_dest
+
+
 def run():
     """detection のメインループ。"""
+    # labeling / replay のワーカーが HSV・深度処理のためにこのモジュールを import しても
+    # torch を読み込まないよう、ultralytics はメインループ内でのみ import する
+    from ultralytics import YOLO
+
     config = load_config()
     cam = config["camera"]
     hsv_config = config["hsv"]
@@ -363,6 +500,15 @@ def run():
     session_time = datetime.now(_JST).strftime("%Y-%m-%d_%H%M%S")
     _setup_logging(session_time)
 
+    try:
+        validate_config(config)
+    except ValueError as e:
+        print(e)
+        return
+    except (TypeError, KeyError) as e:
+        print(f"ERROR: config.yaml の形式が不正です: {e}")
+        return
+
     # モデル存在チェック（ADR 008）
     if not Path(model_path).exists():
         print(f"ERROR: モデルファイルが見つかりません: {model_path}")
@@ -373,20 +519,13 @@ def run():
     logger.info("モデルロード完了: %s", model_path)
 
     # RealSense 初期化（ADR 008）
-    pipeline = rs.pipeline()
-    rs_config = rs.config()
-    rs_config.enable_stream(rs.stream.color, cam["width"], cam["height"], rs.format.bgr8, cam["fps"])
-    rs_config.enable_stream(rs.stream.depth, cam["width"], cam["height"], rs.format.z16, cam["fps"])
-
     try:
-        profile = pipeline.start(rs_config)
+        pipeline, align, intrinsics = _start_camera(cam)
     except RuntimeError as e:
         print(f"ERROR: RealSense D435i が見つかりません: {e}")
         print("  USB 接続を確認してください。rs-enumerate-devices で確認できます。")
         return
-
-    align = rs.align(rs.stream.color)
-    intrinsics = profile.get_stream(rs.stream.color).as_video_stream_profile().get_intrinsics()
+    camera_running = True
 
     # カルマンフィルタ初期化
     dt = 1.0 / cam["fps"]
@@ -403,17 +542,23 @@ def run():
     csv_file, csv_writer = _open_csv(session_time)
 
     # UDP（ADR 010）
-    udp_cfg = config.get("udp", {})
-    udp_enabled = udp_cfg.get("enabled", True)
-    udp_sock = None
-    udp_dest = None
-    if udp_enabled:
+    udp_sock, udp_dest = _open_udp(config.get("udp", {}))
+
+    # メトリクス（更新は常に行い、HTTP 公開は metrics.enabled のときのみ）
+    metrics = _DetectionMetrics(tuple(kf_map))
+    metrics_server = None
+    met_cfg = config["metrics"]
+    if met_cfg["enabled"]:
         try:
-            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp_dest = (udp_cfg.get("host", "127.0.0.1"), udp_cfg.get("port", 50000))
-            logger.info("UDP 送信有効: %s:%d", udp_dest[0], udp_dest[1])
+            metrics_server = start_server(metrics.registry, met_cfg["host"], met_cfg["port"])
         except OSError as e:
-            logger.warning("UDP ソケット作成失敗（送信無効）: %s", e)
+            logger.warning("メトリクスサーバー起動失敗（公開無効）: %s", e)
+
+    # 設定のホットリロード（ADR 006）
+    watcher = None
+    if config["reload"]["enabled"]:
+        watcher = ConfigWatcher(interval=config["reload"]["interval"])
+        watcher.start()
 
     logger.info("計測開始 — camera: %dx%d@%dfps", cam["width"], cam["height"], cam["fps"])
     print("計測開始 — q/ESC で終了")
@@ -423,11 +568,77 @@ def run():
 
     try:
         while True:
+            # 設定変更の反映（フレームの合間にまとめて差し替える）
+            new_config = watcher.poll() if watcher is not None else None
+            if new_config is not None:
+                changed = changed_sections(config, new_config)
+                metrics.config_reloads.inc()
+                logger.info("設定を反映: %s", ", ".join(sorted(changed)) or "変更なし")
+
+                if "hsv" in changed:
+                    hsv_config = new_config["hsv"]
+
+                if "filter" in changed:
+                    flt = new_config["filter"]
+                    for kf in kf_map.values():
+                        kf.set_noise(flt["kalman_q"], flt["kalman_r"])
+
+                if "model" in changed:
+                    confidence = new_config["model"]["confidence"]
+                    new_path = new_config["model"]["path"]
+                    if new_path != model_path:
+                        new_model = None
+                        if not Path(new_path).exists():
+                            logger.warning("モデルファイルが見つかりません（現在のモデルで継続）: %s",
+                                           new_path)
+                        else:
+                            # コピー途中・破損したチェックポイントでも計測を止めない
+                            try:
+                                new_model = YOLO(new_path)
+                            except Exception as e:
+                                logger.warning("モデル読み込み失敗（現在のモデルで継続）: %s: %s",
+                                               new_path, e)
+                        if new_model is not None:
+                            model = new_model
+                            model_path = new_path
+                            logger.info("モデル再ロード完了: %s", model_path)
+                        else:
+                            # 次の設定変更で同じパスを再度試せるよう、現在のパスに戻しておく
+                            new_config["model"] = {**new_config["model"], "path": model_path}
+
+                if "udp" in changed:
+                    if udp_sock is not None:
+                        udp_sock.close()
+                    udp_sock, udp_dest = _open_udp(new_config.get("udp", {}))
+
+                if "camera" in changed:
+                    pipeline.stop()
+                    camera_running = False
+                    try:
+                        pipeline, align, intrinsics = _start_camera(new_config["camera"])
+                        cam = new_config["camera"]
+                    except RuntimeError as e:
+                        logger.warning("カメラ設定の反映に失敗（元の設定で再起動）: %s", e)
+                        try:
+                            pipeline, align, intrinsics = _start_camera(cam)
+                        except RuntimeError as e:
+                            logger.error("RealSense 再起動失敗 — 終了します: %s", e)
+                            break
+                        new_config["camera"] = cam
+                    camera_running = True
+                    for kf in kf_map.values():
+                        kf.set_dt(1.0 / cam["fps"])
+                    logger.info("カメラ再起動 — camera: %dx%d@%dfps",
+                                cam["width"], cam["height"], cam["fps"])
+
+                config = new_config
+
             # フレーム取得（リトライ付き、ADR 008 判断2）
             try:
                 frames = pipeline.wait_for_frames(timeout_ms=5000)
                 retry_count = 0
             except RuntimeError:
+                metrics.drop_timeout.inc()
                 retry_count += 1
                 logger.warning("フレーム取得失敗 (%d/%d)", retry_count, _MAX_RETRY)
                 if retry_count >= _MAX_RETRY:
@@ -440,18 +651,15 @@ def run():
             color_frame = aligned.get_color_frame()
             depth_frame = aligned.get_depth_frame()
             if not color_frame or not depth_frame:
+                metrics.drop_incomplete.inc()
                 continue
 
+            loop_start = time.monotonic()
             color_image = np.asanyarray(color_frame.get_data())
 
             # YOLO 推論
             results = model(color_image, conf=confidence, verbose=False)
 
-            # 各指の処理
-            red_pos = blue_pos = None
-            red_conf = blue_conf = None
-            centroid_pixels: dict[str, tuple[int, int] | None] = {}
-
             # 検出結果をクラス名でマッピング
             detected: dict[str, object] = {}
             if results and len(results) > 0:
@@ -460,38 +668,34 @@ def run():
                     if cls_name in kf_map:
                         detected[cls_name] = box
 
+            # 各指の処理
+            measurements: dict[str, np.ndarray | None] = {}
+            confs: dict[str, float] = {}
+            centroid_pixels: dict[str, tuple[int, int] | None] = {}
+            depth_sources: dict[str, str] = {}
+            for cls_name, box in detected.items():
+                point_3d, conf, pixel = _process_detection(
+                    box, cls_name, color_image, depth_frame, intrinsics,
+                    hsv_config, flt["depth_timeout"],
+                    last_depths, last_depth_times, depth_sources,
+                )
+                measurements[cls_name] = point_3d
+                confs[cls_name] = conf
+                centroid_pixels[cls_name] = pixel
+                metrics.detections[cls_name].inc()
+
             # 全フィルタに predict() を実行し、検出時のみ update()（ADR 002）
-            for cls_name, kf in kf_map.items():
-                kf.predict()
-
-                if cls_name in detected:
-                    box = detected[cls_name]
-                    point_3d, conf, pixel = _process_detection(
-                        box, cls_name, color_image, depth_frame, intrinsics,
-                        hsv_config, flt["depth_timeout"],
-                        last_depths, last_depth_times,
-                    )
-
-                    if point_3d is not None:
-                        kf.update(point_3d)
-
-                    pos = kf.get_position() if kf._initialized else None
-                    centroid_pixels[cls_name] = pixel
-
-                    if cls_name == "red_finger":
-                        red_pos = pos
-                        red_conf = conf
-                    else:
-                        blue_pos = pos
-                        blue_conf = conf
-                else:
-                    # 未検出: predict のみ（フィルタ状態を進める）
-                    if kf._initialized:
-                        pos = kf.get_position()
-                        if cls_name == "red_finger":
-                            red_pos = pos
-                        else:
-                            blue_pos = pos
+            positions = _track_step(kf_map, measurements)
+
+            for cls_name, source in depth_sources.items():
+                metrics.depth_source[cls_name, source].inc()
+            for cls_name, point_3d in measurements.items():
+                if point_3d is not None:
+                    metrics.innovation[cls_name].set(kf_map[cls_name].innovation)
+            red_pos = positions["red_finger"]
+            blue_pos = positions["blue_finger"]
+            red_conf = confs.get("red_finger")
+            blue_conf = confs.get("blue_finger")
 
             # 距離計算
             distance_mm = None
@@ -514,7 +718,15 @@ def run():
 
             # UDP（ADR 010）
             if udp_sock is not None and udp_dest is not None:
-                _send_udp(udp_sock, udp_dest, distance_mm, red_pos, blue_pos)
+                if _send_udp(udp_sock, udp_dest, distance_mm, red_pos, blue_pos):
+                    metrics.udp_packets.inc()
+                else:
+                    metrics.udp_errors.inc()
+
+            # メトリクス
+            metrics.frames.inc()
+            metrics.fps.set(fps)
+            metrics.loop_latency.observe(time.monotonic() - loop_start)
 
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q") or key == 27:
@@ -525,11 +737,17 @@ def run():
     except Exception as e:
         logger.error("予期しないエラー: %s", e)
     finally:
+        if watcher is not None:
+            watcher.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
         csv_file.flush()
         csv_file.close()
         if udp_sock is not None:
             udp_sock.close()
-        pipeline.stop()
+        if camera_running:
+            pipeline.stop()
         cv2.destroyAllWindows()
         logger.info("計測終了")
         print("終了")
@@ -0,0 +1,281 @@
+"""自動ラベル付けモジュール（ADR 002, 003）
+
+capture で保存した `*_rgb.png` に HSV セグメンテーション（+ 既存モデル）で
+YOLO 形式のラベルを事前付与し、training がそのまま読めるデータセットを出力する。
+"""
+
+import csv
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+from finger_tracker.detection import _hsv_mask, _mask_centroid
+
+logger = logging.getLogger(__name__)
+
+# モデルがない場合のクラス順（Roboflow の YOLOv8 エクスポートと同じアルファベット順）
+_CLASS_NAMES = ["blue_finger", "red_finger"]
+_HSV_KEYS = {"red_finger": "red", "blue_finger": "blue"}
+_MODEL_BATCH = 16
+
+
+# ---------------------------------------------------------------------------
+# HSV による BB 推定
+# ---------------------------------------------------------------------------
+
+def _hsv_box(image: np.ndarray, hsv_params: dict, min_area: int):
+    """画像全体の HSV マスクから最大連結成分の BB とスコアを返す。
+
+    スコアは最大成分がマスク全体に占める割合（単一の指サックだけが写って
+    いれば 1.0、背景ノイズが多いほど低い）。見つからなければ None。
+    """
+    mask = _hsv_mask(image, hsv_params)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if n <= 1:
+        return None
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    best = int(np.argmax(areas)) + 1
+    area = int(stats[best, cv2.CC_STAT_AREA])
+    if area < min_area:
+        return None
+    x, y = int(stats[best, cv2.CC_STAT_LEFT]), int(stats[best, cv2.CC_STAT_TOP])
+    w, h = int(stats[best, cv2.CC_STAT_WIDTH]), int(stats[best, cv2.CC_STAT_HEIGHT])
+    score = area / float(areas.sum())
+    return x, y, x + w, y + h, score
+
+
+def _verify_box(image: np.ndarray, box, hsv_params: dict) -> bool:
+    """モデルの BB 内に HSV マスク重心が存在するかを確認する（detection と同じ判定）。"""
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in box)
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(w, x2), min(h, y2)
+    if x2 <= x1 or y2 <= y1:
+        return False
+    return _mask_centroid(_hsv_mask(image[y1:y2, x1:x2], hsv_params)) is not None
+
+
+# ---------------------------------------------------------------------------
+# 1 画像のラベル付け（ワーカープロセスで実行）
+# ---------------------------------------------------------------------------
+
+def _split_for(name: str, val_ratio: float) -> str:
+    """ファイル名のハッシュで train / valid を決定する（再実行しても同じ分割）。"""
+    return "valid" if zlib.crc32(name.encode()) % 1000 < val_ratio * 1000 else "train"
+
+
+def _place_image(src: Path, dst: Path):
+    """画像をデータセットへ配置する。同一デバイスならハードリンクでコピーを省く。"""
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _label_image(image_path: Path, model_boxes: list | None, params: dict) -> dict:
+    """1 枚の画像にラベルを付与し、ラベルファイルを書き出す。
+
+    Args:
+        image_path: `*_rgb.png` のパス。
+        model_boxes: モデル推論結果 [(class_name, x1, y1, x2, y2, conf), ...]。
+            モデルを使わない場合は None。
+        params: label_directory() で作成したパラメータ dict。
+
+    Returns:
+        画像名・分割・ラベル数・スコア・要確認理由の dict。
+    """
+    image = cv2.imread(str(image_path))
+    if image is None:
+        return {"image": image_path.name, "split": None, "labels": 0,
+                "score": 0.0, "reason": "読み込み失敗"}
+    h, w = image.shape[:2]
+
+    labels = []
+    scores = []
+    reasons = []
+    for cls_id, cls_name in enumerate(params["class_names"]):
+        hsv_params = params["hsv"].get(_HSV_KEYS.get(cls_name))
+        if hsv_params is None:
+            continue
+
+        box = None
+        if model_boxes is not None:
+            candidates = [b for b in model_boxes if b[0] == cls_name]
+            if candidates:
+                _, x1, y1, x2, y2, conf = max(candidates, key=lambda b: b[5])
+                box = (x1, y1, x2, y2)
+                if _verify_box(image, box, hsv_params):
+                    scores.append(conf)
+                else:
+                    scores.append(0.0)
+                    reasons.append(f"{cls_name}: BB 内に色マーカーなし")
+
+        if box is None:
+            hsv = _hsv_box(image, hsv_params, params["min_area"])
+            if hsv is None:
+                continue
+            *box, score = hsv
+            scores.append(score)
+            if model_boxes is not None:
+                reasons.append(f"{cls_name}: モデル未検出（HSV のみ）")
+
+        x1, y1, x2, y2 = box
+        labels.append(f"{cls_id} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} "
+                      f"{(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}")
+
+    score = min(scores) if scores else 0.0
+    if not labels:
+        reasons.append("ラベルなし")
+    elif score < params["review_threshold"]:
+        reasons.append(f"低スコア {score:.2f}")
+
+    split = _split_for(image_path.name, params["val_ratio"])
+    out = Path(params["output_dir"]) / split
+    _place_image(image_path, out / "images" / image_path.name)
+    label_path = out / "labels" / f"{image_path.stem}.txt"
+    label_path.write_text("\n".join(labels) + ("\n" if labels else ""))
+
+    return {"image": image_path.name, "split": split, "labels": len(labels),
+            "score": score, "reason": "; ".join(reasons)}
+
+
+# ---------------------------------------------------------------------------
+# モデル推論（メインプロセス）
+# ---------------------------------------------------------------------------
+
+def _model_boxes(model, images: list[Path], confidence: float):
+    """画像ごとのモデル推論結果を順に yield する。"""
+    for start in range(0, len(images), _MODEL_BATCH):
+        batch = [str(p) for p in images[start:start + _MODEL_BATCH]]
+        for result in model.predict(batch, conf=confidence, verbose=False, stream=True):
+            boxes = []
+            for box in result.boxes:
+                x1, y1, x2, y2 = box.xyxy[0].tolist()
+                boxes.append((result.names[int(box.cls[0])], x1, y1, x2, y2,
+                              float(box.conf[0])))
+            yield boxes
+
+
+def _load_model(config: dict):
+    """model.path のモデルがあれば読み込む。なければ None（HSV のみで付与）。"""
+    lab = config["labeling"]
+    model_path = Path(config["model"]["path"])
+    if not lab["use_model"] or not model_path.exists():
+        return None
+    # HSV のみの場合やワーカープロセスでは torch を読み込まない
+    from ultralytics import YOLO
+
+    model = YOLO(str(model_path))
+    logger.info("モデルロード完了: %s", model_path)
+    return model
+
+
+def _write_dataset_yaml(output_dir: Path, class_names: list[str]) -> Path:
+    """training.train が読める data.yaml を書き出す。"""
+    data = {
+        "path": str(output_dir.resolve()),
+        "train": "train/images",
+        "val": "valid/images",
+        "nc": len(class_names),
+        "names": class_names,
+    }
+    path = output_dir / "data.yaml"
+    with open(path, "w") as f:
+        yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+    return path
+
+
+def _write_review(output_dir: Path, rows: list[dict]) -> Path:
+    """要確認の画像を review.csv に書き出す。"""
+    path = output_dir / "review.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "split", "labels", "score", "reason"])
+        for r in rows:
+            writer.writerow([r["image"], r["split"], r["labels"],
+                             f"{r['score']:.2f}", r["reason"]])
+    return path
+
+
+def label_directory(config: dict) -> dict:
+    """labeling.input_dir の画像にラベルを付与し、データセットを出力する。
+
+    Args:
+        config: load_config() で取得した設定 dict。
+
+    Returns:
+        処理枚数・要確認枚数・出力パスなどの集計 dict。
+    """
+    lab = config["labeling"]
+    input_dir = Path(lab["input_dir"])
+    output_dir = Path(lab["output_dir"])
+
+    images = sorted(input_dir.glob("*_rgb.png"))
+    if not images:
+        raise FileNotFoundError(
+            f"ERROR: 画像が見つかりません: {input_dir}/*_rgb.png\n"
+            "  capture モジュールで画像を収集してください。"
+        )
+
+    model = _load_model(config)
+    class_names = list(model.names.values()) if model is not None else _CLASS_NAMES
+
+    for split in ("train", "valid"):
+        (output_dir / split / "images").mkdir(parents=True, exist_ok=True)
+        (output_dir / split / "labels").mkdir(parents=True, exist_ok=True)
+
+    params = {
+        "class_names": class_names,
+        "hsv": config["hsv"],
+        "min_area": lab["min_area"],
+        "review_threshold": lab["review_threshold"],
+        "val_ratio": lab["val_ratio"],
+        "output_dir": str(output_dir),
+    }
+    workers = lab["workers"] or os.cpu_count()
+
+    start = time.monotonic()
+    results = []
+    # モデル推論を併用する場合、親プロセスでは torch のスレッドが動いており fork すると
+    # ワーカーがロック状態ごと複製されうるため spawn で起動する。ワーカーは cv2 / numpy
+    # だけで動く（ultralytics は _load_model 内でのみ import）ので再 import は軽い。
+    # HSV のみの場合は torch を読み込んでいないため、起動の速い既定の fork を使う
+    ctx = multiprocessing.get_context("spawn") if model is not None else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        if model is None:
+            results = list(executor.map(_label_image, images, repeat(None), repeat(params),
+                                        chunksize=16))
+        else:
+            # 推論はメインプロセスで逐次行い、HSV 照合と書き出しはワーカーへ流す
+            futures = [executor.submit(_label_image, p, boxes, params)
+                       for p, boxes in zip(images, _model_boxes(model, images,
+                                                                lab["model_confidence"]))]
+            results = [f.result() for f in futures]
+    elapsed = time.monotonic() - start
+
+    review = [r for r in results if r["reason"]]
+    data_yaml = _write_dataset_yaml(output_dir, class_names)
+    review_csv = _write_review(output_dir, review)
+
+    logger.info("ラベル付け完了: %d 枚 / %.1f 秒 (要確認 %d 枚)",
+                len(results), elapsed, len(review))
+    return {
+        "images": len(results),
+        "review": len(review),
+        "elapsed": elapsed,
+        "model": model is not None,
+        "data_yaml": data_yaml,
+        "review_csv": review_csv,
+    }
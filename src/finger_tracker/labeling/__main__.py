@@ -0,0 +1,21 @@
+"""自動ラベル付けエントリポイント: python -m finger_tracker.labeling"""
+
+from finger_tracker.config import load_config
+from finger_tracker.labeling import label_directory
+
+
+def main():
+    config = load_config()
+    print("自動ラベル付け開始...")
+    summary = label_directory(config)
+    rate = summary["images"] / max(summary["elapsed"], 1e-6) * 60
+    print(f"  処理: {summary['images']} 枚 ({rate:.0f} 枚/分)"
+          f"  方式: {'モデル + HSV' if summary['model'] else 'HSV のみ'}")
+    print(f"  要確認: {summary['review']} 枚 → {summary['review_csv']}")
+    print(f"  データセット: {summary['data_yaml']}")
+    print("  training.dataset にこのパスを設定すると学習に使用できます。")
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
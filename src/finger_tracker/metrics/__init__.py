@@ -0,0 +1,157 @@
+"""計測メトリクスモジュール（ADR 007）
+
+detection の長時間実行を外部から監視するためのカウンタ / ゲージを保持し、
+Prometheus テキスト形式でローカル HTTP ポートから公開する。
+
+値の更新は計測ループのスレッドのみが行い（単一ライタ）、HTTP スレッドは読むだけなので
+ロックは取らない。CPython の GIL 下では属性の読み書きは分断されないため、
+読み出し側は各値の直近の値を得る。
+"""
+
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Value:
+    """1 つの時系列（ラベルの組み合わせ 1 つ分）の値。"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Summary:
+    """観測値の合計と件数（Prometheus の summary の _sum / _count）。"""
+
+    __slots__ = ("sum", "count")
+
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    """メトリクスのファミリー。ラベルごとの時系列を保持する。"""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = label_names
+        self._children: dict[tuple[str, ...], _Value | _Summary] = {}
+        if not label_names:
+            self._default = self.labels()
+
+    def labels(self, *values: str):
+        """ラベル値に対応する時系列を返す。ループ外で事前に取得しておくとよい。"""
+        child = self._children.get(values)
+        if child is None:
+            child = _Summary() if self.kind == "summary" else _Value()
+            self._children[values] = child
+        return child
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _label_str(self, values: tuple[str, ...]) -> str:
+        if not values:
+            return ""
+        pairs = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, values))
+        return "{" + pairs + "}"
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            labels = self._label_str(values)
+            if isinstance(child, _Summary):
+                lines.append(f"{self.name}_sum{labels} {child.sum}")
+                lines.append(f"{self.name}_count{labels} {child.count}")
+            else:
+                lines.append(f"{self.name}{labels} {child.value}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスの登録と Prometheus テキスト形式への変換を行う。"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def _register(self, name: str, help_text: str, kind: str, labels: tuple[str, ...]):
+        metric = _Metric(name, help_text, kind, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> _Metric:
+        return self._register(name, help_text, "counter", labels)
+
+    def gauge(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> _Metric:
+        return self._register(name, help_text, "gauge", labels)
+
+    def summary(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> _Metric:
+        return self._register(name, help_text, "summary", labels)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# HTTP 公開
+# ---------------------------------------------------------------------------
+
+def _make_handler(registry: MetricsRegistry):
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", _CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format, *args)
+
+    return _Handler
+
+
+def start_server(registry: MetricsRegistry, host: str, port: int) -> ThreadingHTTPServer:
+    """バックグラウンドスレッドで /metrics を公開するサーバーを起動する。
+
+    Returns:
+        起動したサーバー。終了時に shutdown() と server_close() を呼ぶ。
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(registry))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info("メトリクス公開: http://%s:%d/metrics", host, port)
+    return server
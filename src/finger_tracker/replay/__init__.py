@@ -0,0 +1,237 @@
+"""記録済みセッションの再生モジュール（ADR 002, 003）
+
+capture の連続保存（manifest.jsonl 付き）を読み込み、YOLO 推論後の処理
+（HSV フィルタ → 深度フォールバック → カルマンフィルタ）をカメラなしで再現する。
+推論結果と BB 内の ROI は事前に切り出しておき、パラメータを変えた再生を何度でも
+安価に繰り返せるようにする。
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pyrealsense2 as rs
+
+from finger_tracker.capture import load_depth, read_manifest
+from finger_tracker.detection import KalmanFilter3D, _measure_roi, _track_step
+from finger_tracker.replay.cache import CACHE_MIN_CONFIDENCE, DetectionCache, frame_hash
+
+logger = logging.getLogger(__name__)
+
+_CLASSES = ("red_finger", "blue_finger")
+
+
+# ---------------------------------------------------------------------------
+# セッション読み込み
+# ---------------------------------------------------------------------------
+
+class _DepthRoi:
+    """BB 内の深度（z16）を rs.depth_frame と同じ get_distance() で引けるようにする。"""
+
+    def __init__(self, depth: np.ndarray, x1: int, y1: int, depth_scale: float):
+        self.depth = depth
+        self.x1 = x1
+        self.y1 = y1
+        self.depth_scale = depth_scale
+
+    def get_distance(self, x: int, y: int) -> float:
+        return float(self.depth[y - self.y1, x - self.x1]) * self.depth_scale
+
+
+@dataclass
+class _Detection:
+    """1 クラス分のクリップ済み BB と ROI。"""
+    box: tuple[int, int, int, int]
+    conf: float
+    color_roi: np.ndarray
+    depth_roi: np.ndarray
+
+
+@dataclass
+class PreparedFrame:
+    """再生用に前処理した 1 フレーム。"""
+    index: int
+    time: float
+    detections: dict[str, _Detection] = field(default_factory=dict)
+
+
+@dataclass
+class PreparedSession:
+    """再生用に前処理したセッション。"""
+    frames: list[PreparedFrame]
+    intrinsics: dict
+    depth_scale: float
+    dt: float
+
+
+def _make_intrinsics(d: dict):
+    """マニフェストの dict から rs.intrinsics を復元する。"""
+    intr = rs.intrinsics()
+    intr.width = d["width"]
+    intr.height = d["height"]
+    intr.ppx = d["ppx"]
+    intr.ppy = d["ppy"]
+    intr.fx = d["fx"]
+    intr.fy = d["fy"]
+    intr.model = getattr(rs.distortion, d["model"].split(".")[-1])
+    intr.coeffs = d["coeffs"]
+    return intr
+
+
+def load_session(session_dir: Path, manifest_name: str = "manifest.jsonl") -> list[dict]:
+    """セッションのマニフェストを読み込む。再生には 2 フレーム以上が必要。"""
+    records = read_manifest(session_dir, manifest_name)
+    if len(records) < 2:
+        raise ValueError(
+            f"ERROR: 再生に必要なフレームが不足しています: {session_dir} ({len(records)} 枚)\n"
+            "  capture の連続保存（b キー）で記録してください。"
+        )
+    return records
+
+
+def infer_boxes(model_path: Path, session_dir: Path, records: list[dict],
+                confidence: float, cache_dir: Path | None = None) -> list[list[tuple]]:
+    """全フレームの YOLO 検出結果 [(class_name, x1, y1, x2, y2, conf), ...] を返す。
+
+    cache_dir を指定すると検出結果を DetectionCache から再利用し、未登録のフレーム
+    だけを推論する。全フレームがキャッシュ済みならモデルは読み込まない。
+    """
+    cache = DetectionCache(cache_dir, model_path) if cache_dir is not None else None
+    infer_conf = confidence
+    if cache is not None:
+        infer_conf = CACHE_MIN_CONFIDENCE
+        if confidence < CACHE_MIN_CONFIDENCE:
+            logger.warning("confidence %.2f はキャッシュの下限 %.2f 未満です",
+                           confidence, CACHE_MIN_CONFIDENCE)
+
+    model = None
+    boxes = []
+    for r in records:
+        image = cv2.imread(str(Path(session_dir) / r["rgb"]))
+        key = frame_hash(image) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key, confidence)
+            if cached is not None:
+                boxes.append(cached)
+                continue
+
+        if model is None:
+            # sweep のワーカーがこのモジュールを import しても torch を読み込まないよう遅延 import
+            from ultralytics import YOLO
+
+            model = YOLO(str(model_path))
+            logger.info("モデルロード完了: %s", model_path)
+        results = model(image, conf=infer_conf, verbose=False)
+        frame_boxes = []
+        if results and len(results) > 0:
+            for box in results[0].boxes:
+                x1, y1, x2, y2 = box.xyxy[0].tolist()
+                frame_boxes.append((results[0].names[int(box.cls[0])],
+                                    x1, y1, x2, y2, float(box.conf[0])))
+        if cache is not None:
+            cache.put(key, frame_boxes)
+            frame_boxes = [b for b in frame_boxes if b[5] >= confidence]
+        boxes.append(frame_boxes)
+
+    if cache is not None:
+        cache.save()
+        logger.info("検出キャッシュ: ヒット %d / 推論 %d", cache.hits, cache.misses)
+    return boxes
+
+
+def prepare_session(session_dir: Path, records: list[dict],
+                    boxes: list[list[tuple]]) -> PreparedSession:
+    """推論結果の BB をクリップし、BB 内の RGB / 深度 ROI だけを切り出して保持する。
+
+    detection と同様、同じクラスの BB が複数あれば最後のものを使う。フレーム時刻には
+    保存時刻（キー入力・連続保存の周期）ではなくセンサーのフレームタイムスタンプを使う。
+    """
+    session_dir = Path(session_dir)
+    frames = []
+    for r, frame_boxes in zip(records, boxes):
+        frame = PreparedFrame(index=r["index"], time=r["frame_timestamp_ms"] / 1000)
+        if frame_boxes:
+            color_image = cv2.imread(str(session_dir / r["rgb"]))
+            depth = load_depth(session_dir / r["depth"])
+            h, w = color_image.shape[:2]
+            for cls_name, bx1, by1, bx2, by2, conf in frame_boxes:
+                if cls_name not in _CLASSES:
+                    continue
+                x1, y1 = max(0, int(bx1)), max(0, int(by1))
+                x2, y2 = min(w, int(bx2)), min(h, int(by2))
+                if x2 <= x1 or y2 <= y1:
+                    frame.detections.pop(cls_name, None)
+                    continue
+                frame.detections[cls_name] = _Detection(
+                    box=(x1, y1, x2, y2), conf=conf,
+                    color_roi=color_image[y1:y2, x1:x2].copy(),
+                    depth_roi=depth[y1:y2, x1:x2].copy(),
+                )
+        frames.append(frame)
+
+    # 連続保存でもフレームの取りこぼしや中断で間隔は一定ではない。dt は代表値で、
+    # replay() はフレームごとに実際の間隔でカルマンフィルタを進める
+    times = np.array([f.time for f in frames])
+    dt = float(np.median(np.diff(times))) if len(times) > 1 else 0.0
+    return PreparedSession(frames=frames, intrinsics=records[0]["intrinsics"],
+                           depth_scale=records[0]["depth_scale"], dt=dt)
+
+
+# ---------------------------------------------------------------------------
+# 再生
+# ---------------------------------------------------------------------------
+
+def replay(session: PreparedSession, hsv_config: dict, flt: dict) -> list[dict]:
+    """前処理済みセッションを指定パラメータで再生する。
+
+    Args:
+        session: prepare_session() の戻り値。
+        hsv_config: config["hsv"] と同じ形式の HSV 閾値。
+        flt: config["filter"] と同じ形式のフィルタ設定。
+
+    Returns:
+        フレームごとの dict — time, distance_mm（フィルタ済み）, raw_distance_mm
+        （フィルタ前の観測値同士）, proc_s（後処理の所要時間）。距離は計測不能なら None。
+    """
+    intrinsics = _make_intrinsics(session.intrinsics)
+    kf_map = {cls: KalmanFilter3D(flt["kalman_q"], flt["kalman_r"], session.dt)
+              for cls in _CLASSES}
+    last_depths: dict[str, float] = {}
+    last_depth_times: dict[str, float] = {}
+
+    outputs = []
+    prev_time = None
+    for frame in session.frames:
+        start = time.perf_counter()
+        if prev_time is not None and frame.time > prev_time:
+            for kf in kf_map.values():
+                kf.set_dt(frame.time - prev_time)
+        prev_time = frame.time
+        measurements: dict[str, np.ndarray | None] = {}
+        for cls_name, det in frame.detections.items():
+            x1, y1, x2, y2 = det.box
+            depth_frame = _DepthRoi(det.depth_roi, x1, y1, session.depth_scale)
+            point_3d, _ = _measure_roi(det.color_roi, x1, y1, x2, y2,
+                                       cls_name, depth_frame, intrinsics,
+                                       hsv_config, flt["depth_timeout"],
+                                       last_depths, last_depth_times,
+                                       now=frame.time)
+            measurements[cls_name] = point_3d
+
+        positions = _track_step(kf_map, measurements)
+        proc_s = time.perf_counter() - start
+
+        distance_mm = raw_distance_mm = None
+        red_pos, blue_pos = positions["red_finger"], positions["blue_finger"]
+        if red_pos is not None and blue_pos is not None:
+            distance_mm = float(np.linalg.norm(red_pos - blue_pos) * 1000)
+        red_raw, blue_raw = measurements.get("red_finger"), measurements.get("blue_finger")
+        if red_raw is not None and blue_raw is not None:
+            raw_distance_mm = float(np.linalg.norm(red_raw - blue_raw) * 1000)
+
+        outputs.append({"time": frame.time, "distance_mm": distance_mm,
+                        "raw_distance_mm": raw_distance_mm, "proc_s": proc_s})
+    return outputs
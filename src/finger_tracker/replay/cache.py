@@ -0,0 +1,128 @@
+"""YOLO 検出結果のキャッシュ
+
+フレームの画素ハッシュをキーに、BB・クラス・信頼度を 1 つの .npz に保存する。
+ファイル名はモデルファイル（models/best.pt）の内容ハッシュから決まるため、
+モデルを差し替えると自動的に別キャッシュになる。他モデルのキャッシュは削除せず残すので、
+元のモデルに戻したときは再利用され、不要になったら手動で削除する。
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# キャッシュに保存する最小信頼度。読み出し時に要求された confidence で絞り込む
+# （NMS は閾値未満の BB を除いてから行われるため、後から絞り込んでも結果は同じ）
+CACHE_MIN_CONFIDENCE = 0.05
+
+_HASH_SIZE = 16
+_CHUNK = 1 << 20
+
+
+def file_hash(path: Path) -> str:
+    """ファイル内容の SHA-256（16 進）を返す。"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def frame_hash(image: np.ndarray) -> bytes:
+    """画像の画素内容から 16 バイトのハッシュを返す。"""
+    h = hashlib.blake2b(digest_size=_HASH_SIZE)
+    h.update(str(image.shape).encode())
+    h.update(np.ascontiguousarray(image).data)
+    return h.digest()
+
+
+class DetectionCache:
+    """フレームハッシュ → [(class_name, x1, y1, x2, y2, conf), ...] のキャッシュ。
+
+    Args:
+        cache_dir: キャッシュファイルの保存先。
+        model_path: 検出に使うモデルファイル。内容ハッシュがキャッシュの識別子になる。
+    """
+
+    def __init__(self, cache_dir: Path, model_path: Path):
+        self.cache_dir = Path(cache_dir)
+        self.model_hash = file_hash(model_path)
+        self.path = self.cache_dir / f"{self.model_hash[:16]}.npz"
+        self.hits = 0
+        self.misses = 0
+        self._names: list[str] = []
+        self._entries: dict[bytes, list[tuple]] = {}
+        self._dirty = False
+        if self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        try:
+            with np.load(self.path) as data:
+                if str(data["model_hash"]) != self.model_hash:
+                    logger.warning("モデルハッシュ不一致のためキャッシュを破棄: %s", self.path)
+                    return
+                names = [str(n) for n in data["names"]]
+                keys, offsets = data["keys"], data["offsets"]
+                boxes, classes, confs = data["boxes"], data["classes"], data["confs"]
+            if keys.ndim != 2 or keys.shape[1] != _HASH_SIZE:
+                raise ValueError(f"キーの形状が不正です: {keys.shape}")
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("キャッシュ読み込み失敗（再生成します）: %s: %s", self.path, e)
+            return
+
+        self._names = names
+        for i, key in enumerate(keys):
+            lo, hi = offsets[i], offsets[i + 1]
+            self._entries[key.tobytes()] = [
+                (names[c], *map(float, b), float(conf))
+                for b, c, conf in zip(boxes[lo:hi], classes[lo:hi], confs[lo:hi])
+            ]
+        logger.info("検出キャッシュ読み込み: %s (%d フレーム)", self.path, len(self._entries))
+
+    def get(self, key: bytes, confidence: float = CACHE_MIN_CONFIDENCE) -> list[tuple] | None:
+        """キャッシュ済みの検出結果を confidence 以上に絞って返す。未登録なら None。"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [b for b in entry if b[5] >= confidence]
+
+    def put(self, key: bytes, boxes: list[tuple]):
+        """検出結果を登録する。boxes は CACHE_MIN_CONFIDENCE で推論したものを渡す。"""
+        for b in boxes:
+            if b[0] not in self._names:
+                self._names.append(b[0])
+        self._entries[key] = list(boxes)
+        self._dirty = True
+
+    def save(self):
+        """変更があればキャッシュを書き出す。"""
+        if not self._dirty:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        # "S16" だと末尾の \x00 が読み出し時に落ちるため、固定長の uint8 配列で保存する
+        keys = np.frombuffer(b"".join(self._entries), dtype=np.uint8).reshape(-1, _HASH_SIZE)
+        counts = [len(v) for v in self._entries.values()]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        rows = [b for v in self._entries.values() for b in v]
+        boxes = np.array([b[1:5] for b in rows], dtype=np.float32).reshape(-1, 4)
+        classes = np.array([self._names.index(b[0]) for b in rows], dtype=np.int16)
+        confs = np.array([b[5] for b in rows], dtype=np.float32)
+
+        tmp = self.path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, model_hash=np.array(self.model_hash),
+                            names=np.array(self._names), keys=keys, offsets=offsets,
+                            boxes=boxes, classes=classes, confs=confs)
+        os.replace(tmp, self.path)
+        self._dirty = False
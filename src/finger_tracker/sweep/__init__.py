@@ -0,0 +1,212 @@
+"""パラメータスイープモジュール（ADR 002, 006）
+
+記録済みセッションを replay で再生し、HSV 閾値・カルマンフィルタ・深度タイムアウトの
+組み合わせをグリッド / ランダム探索する。YOLO 推論は最初に 1 回だけ行い
+（検出キャッシュがあれば推論自体を省略）、各試行はプロセスプールで後処理のみを実行する。
+"""
+
+import copy
+import csv
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from finger_tracker.replay import (PreparedSession, infer_boxes, load_session,
+                                   prepare_session, replay)
+
+logger = logging.getLogger(__name__)
+
+# フィルタ遅延の探索範囲 [フレーム]
+_MAX_LAG_FRAMES = 15
+
+# ワーカープロセスごとに 1 回だけ受け取る前処理済みセッション
+_SESSION: PreparedSession | None = None
+
+
+# ---------------------------------------------------------------------------
+# 試行の生成
+# ---------------------------------------------------------------------------
+
+def _set_dotted(config: dict, key: str, value):
+    """"filter.kalman_q" のようなドット区切りキーで値を設定する。"""
+    *parents, leaf = key.split(".")
+    node = config
+    for p in parents:
+        node = node.setdefault(p, {})
+    node[leaf] = value
+
+
+def _trials(sweep: dict) -> list[dict]:
+    """sweep.params の候補値から試行ごとの上書き値 {dotted_key: value} を作る。"""
+    params = sweep["params"]
+    if not params:
+        raise ValueError(
+            "ERROR: sweep.params が空です\n"
+            "  config.yaml の sweep.params に探索するキーと候補値を指定してください。"
+        )
+    keys = list(params)
+    if sweep["mode"] == "grid":
+        return [dict(zip(keys, values))
+                for values in itertools.product(*(params[k] for k in keys))]
+    if sweep["mode"] == "random":
+        rng = random.Random(sweep["seed"])
+        return [{k: rng.choice(params[k]) for k in keys} for _ in range(sweep["trials"])]
+    raise ValueError(
+        f"ERROR: sweep.mode が不正です: {sweep['mode']}\n"
+        "  grid または random を指定してください。"
+    )
+
+
+# ---------------------------------------------------------------------------
+# 評価
+# ---------------------------------------------------------------------------
+
+def _filter_lag_ms(outputs: list[dict]) -> float:
+    """フィルタ済み距離が観測値に対して何 ms 遅れているかを推定する。
+
+    フィルタ済み系列を k フレームずらしたときに観測系列との平均絶対誤差が
+    最小になる k を遅延とみなし、k フレーム離れたフレーム時刻の差の平均を返す
+    （フレーム間隔は一定とは限らない）。
+    """
+    times = np.array([o["time"] for o in outputs])
+    filtered = np.array([o["distance_mm"] if o["distance_mm"] is not None else np.nan
+                         for o in outputs])
+    raw = np.array([o["raw_distance_mm"] if o["raw_distance_mm"] is not None else np.nan
+                    for o in outputs])
+    best_lag, best_err = 0, np.inf
+    for k in range(min(_MAX_LAG_FRAMES, len(raw) - 1) + 1):
+        diff = np.abs(filtered[k:] - raw[:len(raw) - k])
+        diff = diff[~np.isnan(diff)]
+        if len(diff) == 0:
+            continue
+        err = float(diff.mean())
+        if err < best_err:
+            best_lag, best_err = k, err
+    if best_lag == 0:
+        return 0.0
+    return float(np.mean(times[best_lag:] - times[:-best_lag]) * 1000)
+
+
+def _score(outputs: list[dict], weights: dict) -> dict:
+    """再生結果をジッタ・欠損率・遅延で評価する。score は小さいほど良い。
+
+    フィルタ済み距離は両フィルタの初期化後は毎フレーム得られるため、欠損率は
+    フィルタ前の観測値（両指とも 3D 座標が得られたか）で数える。
+    """
+    dropout = sum(o["raw_distance_mm"] is None for o in outputs) / len(outputs)
+    valid = np.array([o["distance_mm"] for o in outputs if o["distance_mm"] is not None])
+    # 連続フレーム間の変化量のばらつき（静止時の揺れ、移動時のがたつき）
+    jitter_mm = float(np.std(np.diff(valid))) if len(valid) > 2 else float("inf")
+    lag_ms = _filter_lag_ms(outputs)
+    proc_ms = float(np.mean([o["proc_s"] for o in outputs]) * 1000)
+    latency_ms = lag_ms + proc_ms
+    score = (weights["jitter"] * jitter_mm
+             + weights["dropout"] * dropout
+             + weights["latency"] * latency_ms)
+    return {"score": score, "jitter_mm": jitter_mm, "dropout": dropout,
+            "latency_ms": latency_ms, "lag_ms": lag_ms, "proc_ms": proc_ms}
+
+
+# ---------------------------------------------------------------------------
+# ワーカー
+# ---------------------------------------------------------------------------
+
+def _init_worker(session: PreparedSession):
+    global _SESSION
+    _SESSION = session
+
+
+def _run_trial(base: dict, overrides: dict, weights: dict) -> dict:
+    """1 試行分の再生と評価を行う（ワーカープロセスで実行）。"""
+    config = copy.deepcopy(base)
+    for key, value in overrides.items():
+        _set_dotted(config, key, value)
+    outputs = replay(_SESSION, config["hsv"], config["filter"])
+    return _score(outputs, weights)
+
+
+# ---------------------------------------------------------------------------
+# 実行
+# ---------------------------------------------------------------------------
+
+def _write_results(output_dir: Path, rows: list[dict], keys: list[str]) -> Path:
+    """全試行の結果をスコア順に CSV へ書き出す。"""
+    path = output_dir / "sweep_results.csv"
+    metrics = ["score", "jitter_mm", "dropout", "latency_ms", "lag_ms", "proc_ms"]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", *metrics, *keys])
+        for rank, r in enumerate(rows, 1):
+            writer.writerow([rank, *(f"{r[m]:.4f}" for m in metrics),
+                             *(r["params"][k] for k in keys)])
+    return path
+
+
+def _write_best(output_dir: Path, config: dict, overrides: dict) -> Path:
+    """最良試行の hsv / filter セクションを config.yaml に貼り付けられる形で書き出す。"""
+    best = copy.deepcopy({"hsv": config["hsv"], "filter": config["filter"]})
+    for key, value in overrides.items():
+        _set_dotted(best, key, value)
+    path = output_dir / "best_config.yaml"
+    with open(path, "w") as f:
+        yaml.safe_dump(best, f, sort_keys=False, allow_unicode=True)
+    return path
+
+
+def sweep(config: dict) -> dict:
+    """sweep セクションの設定でパラメータ探索を行う。
+
+    Args:
+        config: load_config() で取得した設定 dict。
+
+    Returns:
+        スコア順の試行結果リストと出力パスの dict。
+    """
+    sw = config["sweep"]
+    session_dir = Path(sw["session_dir"])
+    model_path = Path(config["model"]["path"])
+    if not model_path.exists():
+        raise FileNotFoundError(
+            f"ERROR: モデルファイルが見つかりません: {model_path}\n"
+            "  config.yaml の model.path を確認、または学習を実行してください。"
+        )
+
+    records = load_session(session_dir, config["capture"]["manifest"])
+    rp = config["replay"]
+    cache_dir = Path(rp["cache_dir"]) if rp["use_cache"] else None
+    boxes = infer_boxes(model_path, session_dir, records, config["model"]["confidence"],
+                        cache_dir)
+    session = prepare_session(session_dir, records, boxes)
+    logger.info("セッション準備完了: %s (%d フレーム, dt=%.3fs)",
+                session_dir, len(session.frames), session.dt)
+
+    trials = _trials(sw)
+    base = {"hsv": config["hsv"], "filter": config["filter"]}
+    workers = sw["workers"] or os.cpu_count()
+
+    # infer_boxes でキャッシュ外のフレームを推論した場合は親プロセスに torch のスレッドが
+    # 残っているため fork は使わない。replay / detection は ultralytics を遅延 import しており
+    # ワーカーの再 import は cv2 / numpy / pyrealsense2 だけなので、全フレームがキャッシュ済みで
+    # モデルを読み込んでいない場合も spawn の起動コストは小さい
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(session,)) as executor:
+        futures = [executor.submit(_run_trial, base, overrides, sw["weights"])
+                   for overrides in trials]
+        rows = [{**f.result(), "params": overrides}
+                for f, overrides in zip(futures, trials)]
+
+    rows.sort(key=lambda r: r["score"])
+
+    output_dir = Path(sw["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_csv = _write_results(output_dir, rows, list(sw["params"]))
+    best_yaml = _write_best(output_dir, config, rows[0]["params"]) if rows else None
+    return {"rows": rows, "results_csv": results_csv, "best_yaml": best_yaml}
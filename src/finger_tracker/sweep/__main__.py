@@ -0,0 +1,28 @@
+"""パラメータスイープ エントリポイント: python -m finger_tracker.sweep"""
+
+from finger_tracker.config import load_config
+from finger_tracker.sweep import sweep
+
+_TOP_N = 10
+
+
+def main():
+    config = load_config()
+    print("パラメータスイープ開始...")
+    result = sweep(config)
+    rows = result["rows"]
+
+    print(f"\n{'rank':>4} {'score':>9} {'jitter[mm]':>10} {'dropout':>8} {'latency[ms]':>11}  params")
+    for rank, r in enumerate(rows[:_TOP_N], 1):
+        params = "  ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{rank:>4} {r['score']:>9.3f} {r['jitter_mm']:>10.3f} "
+              f"{r['dropout']:>8.3f} {r['latency_ms']:>11.1f}  {params}")
+
+    print(f"\n全 {len(rows)} 試行: {result['results_csv']}")
+    if result["best_yaml"] is not None:
+        print(f"最良設定: {result['best_yaml']} — config.yaml の hsv / filter に反映してください。")
+    print("完了")
+
+
+if __name__ == "__main__":
+    main()
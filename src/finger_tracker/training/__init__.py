@@ -1,25 +1,122 @@
 """YOLOv8-nano fine-tuning モジュール（ADR 004）"""
 
+import json
 import logging
 import shutil
+import time
 from pathlib import Path
 
+import psutil
+import torch
 from ultralytics import YOLO
 
 logger = logging.getLogger(__name__)
 
 _TARGET_MAP50 = 0.90
+_THROUGHPUT_FILE = "throughput.json"
 
 
-def train(config: dict):
-    """YOLOv8-nano の fine-tuning を実行する。
+# ---------------------------------------------------------------------------
+# スループット計測
+# ---------------------------------------------------------------------------
 
-    Args:
-        config: load_config() で取得した設定 dict。
+def _process_tree_rss_mb() -> float:
+    """自プロセスと実行中の子プロセス（dataloader ワーカー）の現在の RSS 合計 [MB]。
 
-    Returns:
-        ultralytics の学習結果オブジェクト。
+    fork したワーカーと共有しているページは重複して数えるため、実使用量より大きめに出る。
     """
+    proc = psutil.Process()
+    total = proc.memory_info().rss
+    for child in proc.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            continue  # 計測中に終了したワーカー
+    return total / 1024**2
+
+
+class _ThroughputRecorder:
+    """ultralytics のコールバックでエポックごとの所要時間と画像/秒を記録する。"""
+
+    def __init__(self):
+        self.save_dir: Path | None = None
+        self.images_per_epoch = 0
+        self.epochs: list[dict] = []
+        self._epoch_start = 0.0
+        self._train_time = 0.0
+        self._peak_rss_mb = 0.0
+
+    def attach(self, model):
+        model.add_callback("on_train_epoch_start", self._on_train_epoch_start)
+        model.add_callback("on_train_batch_end", self._on_train_batch_end)
+        model.add_callback("on_train_epoch_end", self._on_train_epoch_end)
+        model.add_callback("on_fit_epoch_end", self._on_fit_epoch_end)
+        model.add_callback("on_train_end", self._on_train_end)
+
+    def _on_train_epoch_start(self, trainer):
+        self.save_dir = Path(trainer.save_dir)
+        self.images_per_epoch = len(trainer.train_loader.dataset)
+        self._epoch_start = time.monotonic()
+
+    def _on_train_batch_end(self, trainer):
+        # ワーカーは学習中しか存在しないため、終了後ではなくバッチごとに標本を取る
+        self._peak_rss_mb = max(self._peak_rss_mb, _process_tree_rss_mb())
+
+    def _on_train_epoch_end(self, trainer):
+        self._train_time = time.monotonic() - self._epoch_start
+
+    def _on_fit_epoch_end(self, trainer):
+        # 学習 + 検証を含むエポックの壁時計時間
+        wall = time.monotonic() - self._epoch_start
+        self.epochs.append({
+            "epoch": trainer.epoch + 1,
+            "wall_s": round(wall, 3),
+            "train_s": round(self._train_time, 3),
+            "images_per_s": round(self.images_per_epoch / max(self._train_time, 1e-6), 2),
+        })
+
+    def _on_train_end(self, trainer):
+        if self.save_dir is not None:
+            with open(self.save_dir / _THROUGHPUT_FILE, "w") as f:
+                json.dump(self.summary(), f, indent=2)
+
+    def summary(self) -> dict:
+        """エポック時間・画像/秒・ピークメモリの集計を返す。"""
+        train_s = [e["train_s"] for e in self.epochs]
+        summary = {
+            "images_per_epoch": self.images_per_epoch,
+            "epochs": self.epochs,
+            "mean_epoch_wall_s": (round(sum(e["wall_s"] for e in self.epochs) / len(self.epochs), 3)
+                                  if self.epochs else None),
+            "images_per_s": (round(self.images_per_epoch * len(train_s) / sum(train_s), 2)
+                             if train_s and sum(train_s) > 0 else None),
+            "peak_rss_mb": round(self._peak_rss_mb, 1),
+        }
+        if torch.cuda.is_available():
+            summary["peak_cuda_mb"] = round(torch.cuda.max_memory_allocated() / 1024**2, 1)
+        return summary
+
+
+# ---------------------------------------------------------------------------
+# 学習
+# ---------------------------------------------------------------------------
+
+def _train_kwargs(t: dict) -> dict:
+    """training セクションから model.train() の引数を組み立てる。"""
+    return {
+        "epochs": t["epochs"],
+        "patience": t["patience"],
+        "batch": t["batch"],
+        "imgsz": t["imgsz"],
+        "workers": t["workers"],
+        "cache": t["cache"],
+        "rect": t["rect"],
+        "augment": False,  # Roboflow で拡張済み（ADR 004）
+    }
+
+
+def _fit(config: dict, **overrides):
+    """学習を実行し、(結果, スループット記録) を返す。overrides は model.train() の引数を上書きする。"""
     t = config["training"]
     dataset_path = Path(t["dataset"])
 
@@ -29,15 +126,26 @@ def train(config: dict):
             "  Roboflow からエクスポートしたデータセットを配置してください。"
         )
 
+    if t["threads"]:
+        torch.set_num_threads(t["threads"])
+
     model = YOLO(t["base_model"])
-    results = model.train(
-        data=str(dataset_path),
-        epochs=t["epochs"],
-        patience=t["patience"],
-        batch=t["batch"],
-        imgsz=t["imgsz"],
-        augment=False,  # Roboflow で拡張済み（ADR 004）
-    )
+    recorder = _ThroughputRecorder()
+    recorder.attach(model)
+    results = model.train(data=str(dataset_path), **{**_train_kwargs(t), **overrides})
+    return results, recorder
+
+
+def train(config: dict):
+    """YOLOv8-nano の fine-tuning を実行する。
+
+    Args:
+        config: load_config() で取得した設定 dict。
+
+    Returns:
+        ultralytics の学習結果オブジェクト。
+    """
+    results, _ = _fit(config)
     return results
 
 
@@ -65,6 +173,14 @@ def evaluate_and_deploy(config: dict, results):
             map50, _TARGET_MAP50,
         )
 
+    # スループット（エポック時間・画像/秒・ピークメモリ）
+    throughput_path = Path(results.save_dir) / _THROUGHPUT_FILE
+    if throughput_path.exists():
+        with open(throughput_path) as f:
+            tp = json.load(f)
+        print(f"  エポック平均: {tp['mean_epoch_wall_s']} 秒  "
+              f"学習: {tp['images_per_s']} 枚/秒  ピークメモリ: {tp['peak_rss_mb']} MB")
+
     # best.pt を models/ にコピー
     best_pt = Path(results.save_dir) / "weights" / "best.pt"
     models_dir = Path(config["model"]["path"]).parent
@@ -0,0 +1,93 @@
+"""学習スループットのベンチマーク: python -m finger_tracker.training.benchmark
+
+training.benchmark.candidates の各設定で短い学習を行い、画像/秒・エポック時間・
+ピークメモリを比較する。各候補はメモリ計測が混ざらないよう別プロセスで実行する。
+"""
+
+import csv
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from finger_tracker.config import load_config
+from finger_tracker.training import _fit
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_DIR = Path("runs/benchmark")
+
+
+def _label(candidate: dict) -> str:
+    return " ".join(f"{k}={v}" for k, v in candidate.items()) or "baseline"
+
+
+def _run_candidate(config: dict, candidate: dict, name: str) -> dict:
+    """1 候補の短い学習を実行し、スループット集計を返す（子プロセスで実行）。"""
+    bench = config["training"]["benchmark"]
+    config = {**config, "training": {**config["training"], **candidate}}
+    _, recorder = _fit(
+        config,
+        epochs=bench["epochs"],
+        fraction=bench["fraction"],
+        val=False,
+        plots=False,
+        project=str(_PROJECT_DIR),
+        name=name,
+        exist_ok=True,
+    )
+    return recorder.summary()
+
+
+def benchmark(config: dict) -> list[dict]:
+    """候補設定ごとにスループットを計測し、画像/秒の降順で返す。
+
+    Args:
+        config: load_config() で取得した設定 dict。
+
+    Returns:
+        候補ごとの集計 dict のリスト。
+    """
+    candidates = config["training"]["benchmark"]["candidates"] or [{}]
+    ctx = multiprocessing.get_context("spawn")
+
+    rows = []
+    for i, candidate in enumerate(candidates):
+        label = _label(candidate)
+        print(f"  [{i + 1}/{len(candidates)}] {label}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            try:
+                summary = executor.submit(_run_candidate, config, candidate, f"bench_{i}").result()
+            except Exception as e:
+                logger.warning("ベンチマーク失敗 (%s): %s", label, e)
+                continue
+        rows.append({"setting": label, **summary})
+
+    rows.sort(key=lambda r: r["images_per_s"] or 0.0, reverse=True)
+
+    _PROJECT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(_PROJECT_DIR / "benchmark.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["setting", "images_per_s", "mean_epoch_wall_s", "peak_rss_mb"])
+        for r in rows:
+            writer.writerow([r["setting"], r["images_per_s"], r["mean_epoch_wall_s"],
+                             r["peak_rss_mb"]])
+    return rows
+
+
+def main():
+    config = load_config()
+    print("学習スループット ベンチマーク開始...")
+    rows = benchmark(config)
+
+    print(f"\n{'setting':<40} {'img/s':>8} {'epoch[s]':>9} {'peak[MB]':>9}")
+    for r in rows:
+        print(f"{r['setting']:<40} {r['images_per_s'] or 0:>8.1f} "
+              f"{r['mean_epoch_wall_s'] or 0:>9.1f} {r['peak_rss_mb']:>9.0f}")
+    if rows:
+        print(f"\n最速: {rows[0]['setting']} — config.yaml の training に反映してください。")
+    print(f"結果: {_PROJECT_DIR / 'benchmark.csv'}")
+
+
+if __name__ == "__main__":
+    main()